@@ -1,168 +1,530 @@
 import PyPDF2
+import asyncio
+import hashlib
+import io
+import itertools
+import mmap
 import os
 import re
 import json
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
 from pathlib import Path
 import openai
-from collections import defaultdict
-import hashlib
+
+# PyMuPDF extracts text in native C, roughly an order of magnitude faster
+# than PyPDF2; use it when available, fall back to PyPDF2 otherwise
+try:
+    import pymupdf as _pymupdf
+except ImportError:
+    try:
+        import fitz as _pymupdf  # older PyMuPDF releases
+    except ImportError:
+        _pymupdf = None
+
+# Size LLM chunks by what the model actually meters - tokens - when
+# tiktoken is available; fall back to a conservative character budget
+try:
+    import tiktoken
+    _TOKENIZER = tiktoken.encoding_for_model('gpt-3.5-turbo')
+except Exception:  # tiktoken missing, or its vocab files unreachable
+    _TOKENIZER = None
+
+# orjson serializes in C, ~5-10x faster than stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Leaves headroom in the 4k context for the system prompt and response
+_MAX_CHUNK_TOKENS = 3500
+# ~4 chars/token for English prose; used only without tiktoken
+_MAX_CHUNK_CHARS = 4000
+
+# Per-stage pipeline results cached on disk, keyed by PDF content hash
+_CACHE_DIR = Path('.pdfcache')
+
+@dataclass(slots=True)
+class Stats:
+    """Character counts per pipeline stage.
+
+    Fixed attributes instead of a defaultdict: increments on the hot
+    per-page path are plain slot stores, and typos fail loudly. The LLM
+    counter is None until that stage actually runs.
+    """
+    original_chars: int = 0
+    after_initial_cleanup_chars: int = 0
+    after_content_analysis_chars: int = 0
+    after_llm_cleanup_chars: int | None = None
+
+# Pre-compiled patterns (compiling inside the per-page loops re-parses the
+# pattern and hits re's cache on every call, which adds up on large PDFs)
+_RE_CTRL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]')
+# Deletion table for the same control/artifact code points; str.translate
+# is a plain C loop over the string, cheaper than running them through
+# the regex engine
+_CTRL_TABLE = dict.fromkeys(
+    list(range(0x00, 0x09)) + [0x0b, 0x0c] + list(range(0x0e, 0x20))
+    + list(range(0x7f, 0x100)), None)
+# Single fused scanner for initial_cleanup: collapses whitespace runs
+# (keeping line and paragraph structure, see _fused_repl) and drops
+# "Page N of M" footers in one pass instead of one per pattern.
+_RE_FUSED = re.compile(r'(\s+)|(Page \d+ of \d+)')
+
+def _fused_repl(m):
+    ws = m.group(1)
+    if ws is None:
+        return ''
+    if '\n' not in ws:
+        return ' '
+    # Keep blank lines as exactly '\n\n' so paragraph boundaries survive
+    # and content_analysis can split on the literal separator
+    return '\n\n' if ws.count('\n') >= 2 else '\n'
+
+def _chunk_key(chunk):
+    """Stable content hash used to cache LLM responses per chunk."""
+    return hashlib.blake2b(chunk.encode(), digest_size=16).hexdigest()
+
+def _chunk_is_clean(chunk):
+    """Heuristic gate for skipping the LLM on artifact-free chunks.
+
+    Well-extracted prose comes back from the model nearly verbatim, so
+    paying a request for it is pure waste. A chunk counts as clean when
+    it has none of the usual extraction artifacts (form feeds, tabs,
+    double spaces, soft hyphens, control chars) and its paragraph breaks
+    aren't suspiciously dense, which indicates fragmented extraction.
+    """
+    artifact_score = (chunk.count('\x0c') + chunk.count('\t')
+                      + chunk.count('  ') + chunk.count('\u00ad')
+                      + len(_RE_CTRL.findall(chunk)))
+    if artifact_score:
+        return False
+    return chunk.count('\n\n') / max(1, len(chunk)) < 0.01
+
+def _content_chunks(page_text):
+    """Split a page at content-defined boundaries.
+
+    Cutting where a line's checksum hits a modulus (instead of at fixed
+    offsets) means repeated blocks like headers, footers, and TOC text
+    produce identical chunks on every page, so their LLM responses can be
+    cached. crc32 rather than hash() keeps boundaries stable across runs.
+
+    The size cap is measured in tokens when tiktoken is available - the
+    unit the model context and billing actually use - so chunks pack the
+    context fully instead of under-filling on prose or overshooting on
+    code-heavy text.
+    """
+    max_size = _MAX_CHUNK_TOKENS if _TOKENIZER else _MAX_CHUNK_CHARS
+    chunks = []
+    current = []
+    size = 0
+    for line in page_text.splitlines(keepends=True):
+        line_size = len(_TOKENIZER.encode(line)) if _TOKENIZER else len(line)
+
+        if line_size >= max_size:
+            # A line over budget has no boundary to cut at; flush what we
+            # have and hard-slice it so no chunk can exceed the context.
+            # Slicing is deterministic, so the pieces still cache stably.
+            if current:
+                chunks.append(''.join(current))
+                current = []
+                size = 0
+            if _TOKENIZER:
+                tokens = _TOKENIZER.encode(line)
+                for i in range(0, len(tokens), max_size):
+                    chunks.append(_TOKENIZER.decode(tokens[i:i + max_size]))
+            else:
+                for i in range(0, len(line), max_size):
+                    chunks.append(line[i:i + max_size])
+            continue
+
+        # Cut before appending when the line would overflow the budget,
+        # so chunks never exceed max_size
+        if size + line_size > max_size:
+            chunks.append(''.join(current))
+            current = []
+            size = 0
+
+        current.append(line)
+        size += line_size
+        if zlib.crc32(line.encode()) % 64 == 0:
+            chunks.append(''.join(current))
+            current = []
+            size = 0
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+def _stream_map(fn, pages_iter, max_workers):
+    """Map fn over pages with a thread pool, one window at a time.
+
+    executor.map alone would drain the whole input iterator at submit
+    time, defeating the streaming pipeline; working in bounded windows
+    keeps peak memory at O(window) pages instead of O(document).
+    """
+    window = max_workers * 4
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            batch = list(itertools.islice(pages_iter, window))
+            if not batch:
+                break
+            yield from executor.map(fn, batch)
+
+_NAV_WORDS = frozenset({'next', 'previous', 'page', 'chapter'})
+
+_CLEANUP_SYSTEM_PROMPT = ("You are a document cleaning assistant. Your task is to:\n"
+                          "1. Remove any remaining formatting artifacts\n"
+                          "2. Preserve all technical content and code examples\n"
+                          "3. Maintain the original structure of the documentation\n"
+                          "4. Remove redundant information\n"
+                          "5. Format the output in a clean, consistent way\n"
+                          "Return only the cleaned text without any explanations.")
 
 class PDFProcessor:
-    def __init__(self):
-        self.stats = defaultdict(int)
+    def __init__(self, use_batch_api=False, backend='auto'):
+        self.stats = Stats()
+        if backend == 'auto':
+            backend = 'pymupdf' if _pymupdf is not None else 'pypdf2'
+        elif backend == 'pymupdf' and _pymupdf is None:
+            print("PyMuPDF not installed. Falling back to PyPDF2.")
+            backend = 'pypdf2'
+        self.backend = backend
+        # Batch API halves cost and lifts throughput limits, at the price
+        # of waiting for the batch to complete (up to 24h)
+        self.use_batch_api = use_batch_api
         # Try to get API key from environment
         self.api_key = os.getenv('OPENAI_API_KEY')
-        if self.api_key:
-            openai.api_key = self.api_key
+        # Cache of LLM responses keyed by chunk content hash, persisted
+        # across runs so repeated boilerplate is never sent twice
+        self._llm_cache_path = Path('llm_cache.json')
+        try:
+            self._llm_cache = json.loads(self._llm_cache_path.read_text())
+        except (OSError, ValueError):
+            self._llm_cache = {}
+        # Memoized content hashes of PDFs seen this run
+        self._pdf_keys = {}
+
+    def _pdf_cache_key(self, pdf_path):
+        """Content hash of the PDF, so cache entries survive renames."""
+        key = self._pdf_keys.get(pdf_path)
+        if key is None:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(pdf_path, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(block)
+            key = self._pdf_keys[pdf_path] = digest.hexdigest()
+        return key
+
+    def cache_stage(self, pdf_path, stage, pages_iter):
+        """Serve a pipeline stage's pages from the disk cache when present.
+
+        Stages are lazy generators, so a hit here means nothing upstream
+        runs at all; on a miss the pages are captured as they stream past
+        and written out, along with a stats snapshot, once the stage
+        completes.
+        """
+        cache_file = _CACHE_DIR / f'{self._pdf_cache_key(pdf_path)}.{stage}.json'
+        try:
+            cached = json.loads(cache_file.read_text())
+        except (OSError, ValueError):
+            cached = None
+
+        if cached is not None:
+            for name, value in cached['stats'].items():
+                setattr(self.stats, name, value)
+            yield from cached['pages']
+            return
+
+        pages = []
+        for text in pages_iter:
+            pages.append(text)
+            yield text
+
+        _CACHE_DIR.mkdir(exist_ok=True)
+        cache_file.write_text(
+            json.dumps({'stats': asdict(self.stats), 'pages': pages}))
 
     def get_pdf_files(self):
         """List all PDF files in the current directory."""
         return [f for f in os.listdir('.') if f.lower().endswith('.pdf')]
 
+    def _extract_pymupdf(self, pdf_path):
+        """Yield page texts via PyMuPDF; extraction happens in C, so no
+        worker pool is needed."""
+        doc = _pymupdf.open(pdf_path)
+        try:
+            for page_num in range(doc.page_count):
+                yield doc[page_num].get_text("text")
+        finally:
+            doc.close()
+
+    def _extract_pypdf2(self, pdf_path):
+        """Yield page texts via PyPDF2 across a thread pool.
+
+        The file is mmapped so the OS page cache backs every worker; each
+        thread keeps its own mmap view and PdfReader (seek position and
+        xref state aren't shareable), so the xref table is parsed once
+        per thread instead of once per page. Threads suffice because
+        PyPDF2 spends much of its time in zlib, which releases the GIL.
+        """
+        with open(pdf_path, 'rb') as file:
+            views = [mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)]
+            try:
+                num_pages = len(PyPDF2.PdfReader(views[0]).pages)
+                local = threading.local()
+
+                def extract_page(page_num):
+                    reader = getattr(local, 'reader', None)
+                    if reader is None:
+                        view = mmap.mmap(file.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+                        views.append(view)
+                        reader = local.reader = PyPDF2.PdfReader(view)
+                    return reader.pages[page_num].extract_text()
+
+                num_workers = min(os.cpu_count() or 1, 4)
+                with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                    yield from executor.map(extract_page, range(num_pages))
+            finally:
+                for view in views:
+                    view.close()
+
     def extract_text_from_pdf(self, pdf_path):
-        """Extract raw text from PDF."""
-        self.stats['original_chars'] = 0
-        text_by_page = []
-        
+        """Extract raw text from PDF, yielding one page at a time."""
+        self.stats.original_chars = 0
+
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    self.stats['original_chars'] += len(text)
-                    text_by_page.append(text)
-                
-            return text_by_page
+            if self.backend == 'pymupdf':
+                pages = self._extract_pymupdf(pdf_path)
+            else:
+                pages = self._extract_pypdf2(pdf_path)
+            for text in pages:
+                self.stats.original_chars += len(text)
+                yield text
         except Exception as e:
             print(f"Error reading PDF: {e}")
-            return []
 
-    def initial_cleanup(self, text_by_page):
-        """First pass cleanup of obvious formatting issues."""
-        cleaned_pages = []
-        self.stats['after_initial_cleanup_chars'] = 0
-        
-        for page_text in text_by_page:
-            # Remove repeated whitespace
-            text = re.sub(r'\s+', ' ', page_text)
-            
-            # Remove common PDF artifacts
-            text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]', '', text)
-            
-            # Remove repeated line numbers
-            text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
-            
-            # Remove headers/footers that appear on every page (customize based on your PDFs)
-            text = re.sub(r'Page \d+ of \d+', '', text)
-            
-            # Remove duplicate adjacent lines
-            lines = text.split('\n')
-            unique_lines = []
-            prev_line_hash = None
-            for line in lines:
-                line_hash = hashlib.md5(line.strip().encode()).hexdigest()
-                if line_hash != prev_line_hash:
-                    unique_lines.append(line)
-                prev_line_hash = line_hash
-            
-            text = '\n'.join(unique_lines)
-            self.stats['after_initial_cleanup_chars'] += len(text)
-            cleaned_pages.append(text)
-        
-        return cleaned_pages
-
-    def content_analysis(self, text_by_page):
-        """Analyze and clean content based on semantic understanding."""
-        self.stats['after_content_analysis_chars'] = 0
-        processed_pages = []
-        
-        for page_text in text_by_page:
-            # Split into paragraphs
-            paragraphs = re.split(r'\n\s*\n', page_text)
-            
-            valid_paragraphs = []
-            for para in paragraphs:
-                # Skip if too short or looks like a header/footer
-                if len(para.strip()) < 10:
-                    continue
-                    
-                # Skip if it's just numbers or special characters
-                if re.match(r'^[\d\W\s]+$', para.strip()):
-                    continue
-                
-                # Skip if it looks like a navigation element or repeated UI text
-                if re.match(r'^(next|previous|page|chapter|\d+)\s*$', para.strip(), re.I):
-                    continue
-                
-                valid_paragraphs.append(para)
-            
-            processed_text = '\n\n'.join(valid_paragraphs)
-            self.stats['after_content_analysis_chars'] += len(processed_text)
-            processed_pages.append(processed_text)
-        
-        return processed_pages
-
-    def llm_cleanup(self, text_by_page):
-        """Use OpenAI API to clean and structure the content."""
-        if not self.api_key:
-            print("No OpenAI API key found. Skipping LLM cleanup.")
-            return text_by_page
+    def _clean_one_page(self, page_text):
+        """Clean a single page; safe to run from worker threads."""
+        # Drop control chars with a translate table, then one fused regex
+        # pass collapses whitespace and removes "Page N of M" footers
+        # (customize the footer pattern based on your PDFs)
+        text = _RE_FUSED.sub(_fused_repl, page_text.translate(_CTRL_TABLE))
 
-        self.stats['after_llm_cleanup_chars'] = 0
-        processed_pages = []
-        
-        try:
-            for page_text in text_by_page:
-                # Skip empty pages
-                if not page_text.strip():
-                    continue
-                    
-                # Process in chunks if the text is too long
-                chunks = [page_text[i:i+4000] for i in range(0, len(page_text), 4000)]
-                cleaned_chunks = []
-                
-                for chunk in chunks:
-                    response = openai.ChatCompletion.create(
+        # Remove duplicate adjacent lines and bare line numbers
+        unique_lines = []
+        prev_line = None
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped.isdigit():
+                continue
+            if stripped != prev_line:
+                unique_lines.append(line)
+            prev_line = stripped
+
+        return '\n'.join(unique_lines)
+
+    def initial_cleanup(self, pages_iter):
+        """First pass cleanup of obvious formatting issues; yields pages."""
+        # Pages are independent and re releases the GIL on large inputs,
+        # so the per-page work runs on a thread pool; stats accumulate
+        # here in the consumer, keeping the workers free of shared state
+        self.stats.after_initial_cleanup_chars = 0
+        for text in _stream_map(self._clean_one_page, pages_iter,
+                                os.cpu_count() or 1):
+            self.stats.after_initial_cleanup_chars += len(text)
+            yield text
+
+    def _analyze_one_page(self, page_text):
+        """Filter one page's paragraphs; safe to run from worker threads."""
+        # Split into paragraphs; initial_cleanup normalizes paragraph
+        # breaks to exactly '\n\n', so a plain str.split suffices and
+        # avoids running the regex engine over the whole page
+        paragraphs = page_text.split('\n\n')
+
+        valid_paragraphs = []
+        for para in paragraphs:
+            stripped = para.strip()
+
+            # Skip if too short or looks like a header/footer
+            if len(stripped) < 10:
+                continue
+
+            # Skip if it's just numbers or special characters
+            if not any(ch.isalpha() for ch in stripped):
+                continue
+
+            # Skip if it looks like a navigation element or repeated UI text
+            if stripped.lower() in _NAV_WORDS:
+                continue
+
+            valid_paragraphs.append(para)
+
+        return '\n\n'.join(valid_paragraphs)
+
+    def content_analysis(self, pages_iter):
+        """Analyze and clean content based on semantic understanding; yields pages."""
+        self.stats.after_content_analysis_chars = 0
+        for text in _stream_map(self._analyze_one_page, pages_iter,
+                                os.cpu_count() or 1):
+            self.stats.after_content_analysis_chars += len(text)
+            yield text
+
+    async def _clean_chunk_async(self, client, sem, chunk):
+        """Clean one chunk, retrying rate limits with exponential backoff."""
+        async with sem:
+            delay = 1.0
+            while True:
+                try:
+                    response = await client.chat.completions.create(
                         model="gpt-3.5-turbo",
                         messages=[
-                            {"role": "system", "content": "You are a document cleaning assistant. Your task is to:\n"
-                                                        "1. Remove any remaining formatting artifacts\n"
-                                                        "2. Preserve all technical content and code examples\n"
-                                                        "3. Maintain the original structure of the documentation\n"
-                                                        "4. Remove redundant information\n"
-                                                        "5. Format the output in a clean, consistent way\n"
-                                                        "Return only the cleaned text without any explanations."},
+                            {"role": "system", "content": _CLEANUP_SYSTEM_PROMPT},
                             {"role": "user", "content": chunk}
                         ],
                         temperature=0.0
                     )
-                    cleaned_text = response.choices[0].message.content
-                    cleaned_chunks.append(cleaned_text)
-                
-                processed_text = '\n'.join(cleaned_chunks)
-                self.stats['after_llm_cleanup_chars'] += len(processed_text)
-                processed_pages.append(processed_text)
-                
+                    return response.choices[0].message.content
+                except openai.RateLimitError:
+                    if delay > 32:
+                        raise
+                    await asyncio.sleep(delay)
+                    delay *= 2
+
+    async def _llm_cleanup_async(self, chunks):
+        """Fire all chunk requests concurrently under a bounded semaphore."""
+        client = openai.AsyncOpenAI(api_key=self.api_key)
+        sem = asyncio.Semaphore(10)
+        try:
+            tasks = [self._clean_chunk_async(client, sem, chunk) for chunk in chunks]
+            return await asyncio.gather(*tasks)
+        finally:
+            await client.close()
+
+    def _llm_cleanup_batch(self, chunks):
+        """Clean all chunks through the Batch API; blocks until complete."""
+        client = openai.OpenAI(api_key=self.api_key)
+
+        # One chat-completion request per chunk, keyed by index
+        lines = []
+        for idx, chunk in enumerate(chunks):
+            lines.append(json.dumps({
+                "custom_id": f"chunk{idx}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-3.5-turbo",
+                    "messages": [
+                        {"role": "system", "content": _CLEANUP_SYSTEM_PROMPT},
+                        {"role": "user", "content": chunk}
+                    ],
+                    "temperature": 0.0
+                }
+            }))
+
+        batch_file = client.files.create(
+            file=io.BytesIO('\n'.join(lines).encode('utf-8')),
+            purpose='batch')
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h')
+
+        print(f"Submitted batch {batch.id} with {len(chunks)} chunks, waiting...")
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(30)
+            batch = client.batches.retrieve(batch.id)
+
+        if batch.status != 'completed':
+            raise RuntimeError(f"Batch {batch.id} finished with status '{batch.status}'")
+
+        # Stitch responses back into submission order by custom_id
+        results = {}
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            record = json.loads(line)
+            content = record['response']['body']['choices'][0]['message']['content']
+            results[record['custom_id']] = content
+
+        return [results[f"chunk{idx}"] for idx in range(len(chunks))]
+
+    def llm_cleanup(self, pages_iter):
+        """Use OpenAI API to clean and structure the content; yields pages."""
+        if not self.api_key:
+            print("No OpenAI API key found. Skipping LLM cleanup.")
+            yield from pages_iter
+            return
+
+        # This stage has to drain the pipeline: concurrent requests and
+        # chunk dedup both need every chunk in hand before calling out.
+        # The counter resets only after the drain, so the upstream
+        # 'cleaned' snapshot written during it keeps the None sentinel
+        text_by_page = list(pages_iter)
+        self.stats.after_llm_cleanup_chars = 0
+
+        # Chunk every non-empty page up front so all requests can be in
+        # flight at once instead of paying one round trip per chunk
+        chunks_by_page = []
+        for page_text in text_by_page:
+            # Skip empty pages
+            if not page_text.strip():
+                continue
+            chunks_by_page.append(_content_chunks(page_text))
+
+        try:
+            # Only send chunks whose content hash we haven't seen before;
+            # duplicates within the document and across runs are cache
+            # hits, and chunks with no artifacts to fix skip the API too
+            pending = {}
+            for chunks in chunks_by_page:
+                for chunk in chunks:
+                    key = _chunk_key(chunk)
+                    if (key not in self._llm_cache and key not in pending
+                            and not _chunk_is_clean(chunk)):
+                        pending[key] = chunk
+
+            if pending:
+                miss_chunks = list(pending.values())
+                if self.use_batch_api:
+                    cleaned = self._llm_cleanup_batch(miss_chunks)
+                else:
+                    cleaned = asyncio.run(self._llm_cleanup_async(miss_chunks))
+
+                for key, cleaned_text in zip(pending, cleaned):
+                    self._llm_cache[key] = cleaned_text
+                self._llm_cache_path.write_text(json.dumps(self._llm_cache))
+
         except Exception as e:
             print(f"Error in LLM processing: {e}")
-            return text_by_page
-            
-        return processed_pages
+            yield from text_by_page
+            return
+
+        for chunks in chunks_by_page:
+            # Chunks gated out as already clean pass through verbatim
+            processed_text = '\n'.join(
+                self._llm_cache.get(_chunk_key(chunk), chunk) for chunk in chunks)
+            self.stats.after_llm_cleanup_chars += len(processed_text)
+            yield processed_text
 
-    def save_output(self, text_by_page, output_path):
-        """Save the processed text to a file."""
+    def save_output_stream(self, pages_iter, output_path):
+        """Write pages to a file as they arrive from the pipeline."""
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                for i, page_text in enumerate(text_by_page, 1):
-                    f.write(f"\n=== Page {i} ===\n\n")
-                    f.write(page_text)
-                    f.write('\n')
+            # A 1 MiB buffer and one write per page keep syscalls to a
+            # minimum when many small pages stream through
+            with open(output_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                for i, page_text in enumerate(pages_iter, 1):
+                    f.write(f"\n=== Page {i} ===\n\n{page_text}\n")
             
             # Save statistics
             stats_path = output_path + '.stats.json'
-            with open(stats_path, 'w') as f:
-                json.dump(self.stats, f, indent=2)
+            if orjson is not None:
+                Path(stats_path).write_bytes(
+                    orjson.dumps(asdict(self.stats), option=orjson.OPT_INDENT_2))
+            else:
+                with open(stats_path, 'w') as f:
+                    json.dump(asdict(self.stats), f, indent=2)
                 
         except Exception as e:
             print(f"Error saving output: {e}")
@@ -197,38 +559,38 @@ def main():
             print("Please enter a valid number.")
 
     print(f"\nProcessing {pdf_path}...")
-    
-    # Extract text
-    print("Extracting text...")
-    text_by_page = processor.extract_text_from_pdf(pdf_path)
-
-    # Initial cleanup
-    print("Performing initial cleanup...")
-    text_by_page = processor.initial_cleanup(text_by_page)
-
-    # Content analysis
-    print("Analyzing content...")
-    text_by_page = processor.content_analysis(text_by_page)
 
-    # LLM cleanup
-    print("Performing LLM cleanup...")
-    text_by_page = processor.llm_cleanup(text_by_page)
+    # Build the streaming pipeline: each stage is a generator, so pages
+    # flow through extraction, cleanup, analysis, and LLM cleanup one at
+    # a time and are written out as they complete
+    # Each cache_stage call short-circuits everything above it on a rerun
+    # of the same PDF bytes
+    pages = processor.extract_text_from_pdf(pdf_path)
+    pages = processor.cache_stage(pdf_path, 'extracted', pages)
+    pages = processor.initial_cleanup(pages)
+    pages = processor.content_analysis(pages)
+    pages = processor.cache_stage(pdf_path, 'cleaned', pages)
+    pages = processor.llm_cleanup(pages)
+    if processor.api_key:
+        # Only cache LLM output when the stage actually ran, so a later
+        # run with a key doesn't mistake the passthrough for cleaned text
+        pages = processor.cache_stage(pdf_path, 'llm', pages)
 
-    # Save output
+    # Save output (this drives the pipeline)
     output_path = Path(pdf_path).stem + '_cleaned.txt'
-    processor.save_output(text_by_page, output_path)
+    processor.save_output_stream(pages, output_path)
 
     # Display statistics
     stats = processor.stats
     print("\nProcessing Statistics:")
-    print(f"Original size: {stats['original_chars']:,} chars")
-    print(f"After initial cleanup: {stats['after_initial_cleanup_chars']:,} chars "
-          f"({stats['after_initial_cleanup_chars']/stats['original_chars']*100:.1f}%)")
-    print(f"After content analysis: {stats['after_content_analysis_chars']:,} chars "
-          f"({stats['after_content_analysis_chars']/stats['original_chars']*100:.1f}%)")
-    if 'after_llm_cleanup_chars' in stats:
-        print(f"After LLM cleanup: {stats['after_llm_cleanup_chars']:,} chars "
-              f"({stats['after_llm_cleanup_chars']/stats['original_chars']*100:.1f}%)")
+    print(f"Original size: {stats.original_chars:,} chars")
+    print(f"After initial cleanup: {stats.after_initial_cleanup_chars:,} chars "
+          f"({stats.after_initial_cleanup_chars/stats.original_chars*100:.1f}%)")
+    print(f"After content analysis: {stats.after_content_analysis_chars:,} chars "
+          f"({stats.after_content_analysis_chars/stats.original_chars*100:.1f}%)")
+    if stats.after_llm_cleanup_chars is not None:
+        print(f"After LLM cleanup: {stats.after_llm_cleanup_chars:,} chars "
+              f"({stats.after_llm_cleanup_chars/stats.original_chars*100:.1f}%)")
 
     print(f"\nProcessing complete! Output saved to {output_path}")
     print(f"Statistics saved to {output_path}.stats.json")